@@ -22,17 +22,12 @@ def parse_requirements(name=None):
     else:
         reqf = 'requirements.txt'
 
-    requirements = []
     if not path.exists(reqf):
-        return requirements
+        return []
 
     with open(reqf) as f:
-        for line in f.readlines():
-            line = line.strip()
-            if not line or line.startswith('#'):
-                continue
-            requirements.append(line)
-    return requirements
+        return [line.strip() for line in f
+                if line.strip() and not line.strip().startswith('#')]
 
 
 setup(
@@ -7,19 +7,99 @@
 
 """
 
+import hashlib
+import json
+import os
 import requests
 import sys
+import tempfile
+import time
 
 from abc import ABCMeta, abstractmethod
 
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+CACHE_TTL = 300  # seconds
+
+# http statuses worth a retry: rate limiting or transient server errors
+TRANSIENT_STATUSES = (429, 500, 502, 503, 504)
+
+
+def make_session(pool_maxsize=32):
+    """Build a requests session pooling connections to the apis and
+       retrying on transient server errors.
+
+    Reusing one session amortizes the tcp/tls handshake over every call
+    to the same host instead of paying it per request.
+
+    Args:
+        pool_maxsize: connections kept per host; callers dispatching to
+                      worker threads size this to their concurrency so
+                      no worker waits on a pooled connection.
+
+    """
+    session = requests.Session()
+    # posts are left out of the transport-level retry on purpose: not
+    # every api post is idempotent (diffusion.uri.edit). Callers retry
+    # those at the application level where they can tell.
+    session.mount('https://', HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=pool_maxsize,
+        max_retries=Retry(total=5, backoff_factor=0.5,
+                          status_forcelist=TRANSIENT_STATUSES)))
+    return session
+
+
+SESSION = make_session()
+"""Default session shared by every request of the process."""
+
+
+def cache_dir():
+    """Compute the directory holding the on-disk response cache.
+
+    """
+    default = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(os.environ.get('XDG_CACHE_HOME', default),
+                        'swh-mirror-forge')
+
+
+def clear_cache():
+    """Drop every cached response. Called after a write to the forge so
+       that read queries do not serve stale data.
+
+    """
+    directory = cache_dir()
+    try:
+        entries = os.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in entries:
+        if name.endswith('.json'):
+            try:
+                os.remove(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+
 
 class Request(metaclass=ABCMeta):
     """Class in charge of providing connection request to forge's api.
 
     """
-    def __init__(self, forge_url, api_token):
+    cacheable = False
+    """Whether responses may be served from the on-disk cache."""
+
+    def __init__(self, forge_url, api_token, use_cache=True, session=None):
         self.forge_url = forge_url
         self.api_token = api_token
+        self.use_cache = use_cache
+        self.session = session if session is not None else SESSION
 
     @abstractmethod
     def url(self):
@@ -43,36 +123,88 @@ class Request(metaclass=ABCMeta):
         return data['data']
 
     def post(self, body):
-        """Actual execution of the request.
+        """Actual execution of the request as one http post query to the
+           forge's api.
 
         Args:
             body: the payload of the request.
 
+        Returns:
+            The parsed response on success.
+
+        Raises:
+            ValueError if the query failed at the http level or the api
+            reported an error.
+
         """
+        return self.parse_response(self.post_raw(body))
+
+    def post_raw(self, body):
+        """Execute the query and return the raw api result, without
+           going through parse_response. Used by subclasses needing
+           access to response metadata such as pagination cursors.
+
+        """
+        cache_path = None
+        if self.cacheable and self.use_cache:
+            # the key excludes the api token (not added to body yet)
+            # but includes the forge url so identical queries against
+            # different forges cannot collide
+            key = hashlib.sha1(json.dumps(
+                [self.forge_url, self.url(), sorted(body.items())],
+                sort_keys=True).encode()).hexdigest()
+            cache_path = os.path.join(cache_dir(), '%s.json' % key)
+            try:
+                if time.time() - os.stat(cache_path).st_mtime < CACHE_TTL:
+                    with open(cache_path) as f:
+                        return json.load(f)
+            except (OSError, ValueError):
+                pass
+
         body['api.token'] = self.api_token
 
-        r = requests.post('%s/api/%s' % (self.forge_url, self.url()),
-                          data=body)
+        api_url = '%s/api/%s' % (self.forge_url, self.url())
+        for attempt in range(3):
+            r = self.session.post(api_url, data=body)
+            # read-only calls are safe to replay on transient errors
+            if (self.cacheable and attempt < 2
+                    and r.status_code in TRANSIENT_STATUSES):
+                time.sleep(0.5 * 2 ** attempt)
+                continue
+            break
 
-        if r.ok:
+        if not r.ok:
+            raise ValueError(
+                'Error: unexpected status code %s when posting to %s' % (
+                    r.status_code, self.url()))
+
+        if orjson is not None:  # c-backed parser, when available
+            data = orjson.loads(r.content)
+        else:
             data = r.json()
-            if 'error_code' in data and data['error_code'] is not None:
-                print('Error posting %s to %s' % (body, self.url()),
-                      file=sys.stderr)
-                raise ValueError("Error: %s - %s" % (
-                    data['error_code'], data['error_info']))
+        if data.get('error_code') is not None:
+            print('Error posting %s to %s' % (body, self.url()),
+                  file=sys.stderr)
+            raise ValueError("Error: %s - %s" % (
+                data['error_code'], data['error_info']))
 
-            return self.parse_response(data['result'])
+        result = data['result']
+        if cache_path is not None:
+            os.makedirs(cache_dir(), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir())
+            with os.fdopen(fd, 'w') as f:
+                json.dump(result, f)
+            os.replace(tmp_path, cache_path)
 
-        if 'error_code' in data and data['error_code'] is not None:
-            raise ValueError("Error: %s - %s" % (
-                data['error_code'], data['error_message']))
+        return result
 
 
 class RepositorySearch(Request):
     """Abstraction over the repository search api call.
 
     """
+    cacheable = True
+
     def url(self):
         return 'diffusion.repository.search'
 
@@ -81,6 +213,8 @@ class PassphraseSearch(Request):
     """Abstraction over the passphrase search api call.
 
     """
+    cacheable = True
+
     def url(self):
         return 'passphrase.query'
 
@@ -101,19 +235,36 @@ class RepositoriesToMirror(RepositorySearch):
        id, phid) of repository to mirror.
 
     """
+    def post(self, body):
+        """Execute the query, transparently following conduit's cursor
+           pagination. Entries are yielded as each page arrives, so
+           callers start working on page one while later pages are only
+           fetched on demand.
+
+        """
+        after = None
+        while True:
+            page_body = dict(body)
+            if after is not None:
+                page_body['after'] = after
+            result = self.post_raw(page_body)
+            for repo in self.parse_response(result):
+                yield repo
+            after = (result.get('cursor') or {}).get('after')
+            if after is None:
+                break
+
     def parse_response(self, data):
         data = super().parse_response(data)
         for entry in data:
-            fields = entry['fields']
-            repo = {
-                'name': fields['name']
-            }
-            if 'id' in entry:
-                repo['id'] = entry['id']
-            elif 'phid' in entry:
-                repo['id'] = entry['phid']
-            elif 'callsign' in fields:
-                repo['id'] = fields['callsign']
-            else:
+            # most common key first: conduit entries carry an id
+            repo_id = (entry.get('id') or entry.get('phid')
+                       or entry['fields'].get('callsign'))
+            if repo_id is None:
                 continue
+            repo = {'name': entry['fields']['name'], 'id': repo_id}
+            # when the caller asked for attachments, keep the full
+            # entry so no per-repository search is needed downstream
+            if entry.get('attachments', {}).get('uris'):
+                repo['information'] = entry
             yield repo
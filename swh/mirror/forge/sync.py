@@ -4,12 +4,115 @@
 # See top-level LICENSE file for more information
 
 import click
+import itertools
 import sys
-import requests
+import threading
+import time
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor
+from concurrent.futures import as_completed, wait
+
+# SWHConfig is a base class of SWHMirrorForge so it cannot be imported
+# lazily; .request (which pulls in requests and urllib3) is imported
+# from the methods needing it to keep --help and other short-lived
+# invocations from paying the full import graph.
 from swh.core.config import SWHConfig
-from .request import RepositorySearch, PassphraseSearch
-from .request import DiffusionUriEdit, RepositoriesToMirror
+
+
+# Default bound on the number of repositories processed concurrently,
+# overridable through the 'concurrency' configuration key
+MAX_WORKERS = 8
+
+# How long a repository listing stays fresh in memory, letting
+# back-to-back bulk commands reuse one conduit traversal
+REPO_LIST_TTL = 300  # seconds
+
+# Serializes the output of worker threads so messages don't interleave
+PRINT_LOCK = threading.Lock()
+
+
+def locked_print(msg):
+    """Print msg atomically with respect to other worker threads.
+
+    """
+    with PRINT_LOCK:
+        print(msg)
+
+
+# Prefix of the uris the forge pushes to as github mirrors. Matching on
+# this full prefix avoids false positives on urls merely containing
+# 'github' (e.g. githubusercontent).
+GITHUB_URL_PREFIX = 'git@github.com:'
+
+# Constant part of the diffusion.uri.edit payload installing a mirror
+# uri, built once instead of per repository. Slots 0 (credential) and 1
+# (uri) vary per call and are filled in by the caller, as is slot 5
+# (repository) when the uri does not exist yet.
+MIRROR_TRANSACTION_DATA = {
+    'transactions[2][type]': 'io',
+    'transactions[2][value]': 'mirror',
+    'transactions[3][type]': 'display',
+    'transactions[3][value]': 'never',
+    'transactions[4][type]': 'disable',
+    'transactions[4][value]': 'false',
+}
+
+
+# Repository settings enforced on every github mirror; name,
+# description and homepage vary per repository and are merged in at
+# call time.
+GITHUB_REPO_SETTINGS = {
+    "private": False,
+    "has_issues": False,
+    "has_wiki": False,
+    "has_downloads": True,
+    "has_projects": False,
+}
+
+
+def rate_limit_delay(response):
+    """How long to wait before retrying a rate-limited github call.
+
+    Args:
+        response: the rejected requests response.
+
+    Returns:
+        delay in seconds, or None when the response is not a rate-limit
+        rejection.
+
+    """
+    retry_after = response.headers.get('Retry-After')
+    if retry_after is not None:
+        return max(1, int(retry_after))
+    if response.headers.get('X-RateLimit-Remaining') == '0':
+        reset = response.headers.get('X-RateLimit-Reset')
+        if reset is not None:
+            return max(1, int(int(reset) - time.time()))
+    return None
+
+
+def classify_repo_id(repo_id):
+    """Classify a repository identifier into its conduit search
+       constraint.
+
+    Digit strings are coerced to int so equivalent identifiers share
+    one canonical form (and hence one cache entry).
+
+    Args:
+        repo_id (int, str): id, phid or callsign.
+
+    Returns:
+        tuple (constraint_key, canonical identifier).
+
+    """
+    if isinstance(repo_id, str):
+        if repo_id.isdigit():
+            repo_id = int(repo_id)
+        elif repo_id[:4] == 'PHID':
+            return 'phids', repo_id
+        else:
+            return 'callsigns', repo_id
+    return 'ids', repo_id
 
 
 def mirror_exists(data):
@@ -18,21 +121,18 @@ def mirror_exists(data):
     Args:
         data: full information on the repository
 
-    Returns
-        True if mirror already exists. False otherwise.
+    Returns:
+        dict with keys phid, effective and credential describing the
+        mirror uri if one exists. None otherwise.
 
     """
-    uris = data['attachments']['uris']['uris']
-    for uri in uris:
-        effective_url = uri['fields']['uri']['effective']
-        if effective_url.startswith('git@github.com:'):
-            return {
-                'phid': uri['phid'],
-                'effective': uri['fields']['uri']['effective'],
-                'credential': uri['fields']['credentialPHID'],
-            }
-
-    return None
+    return next(
+        ({'phid': uri['phid'],
+          'effective': uri['fields']['uri']['effective'],
+          'credential': uri['fields']['credentialPHID']}
+         for uri in data['attachments']['uris']['uris']
+         if uri['fields']['uri']['effective'].startswith(GITHUB_URL_PREFIX)),
+        None)
 
 
 def format_repo_information(data, forge_base_url, github_org_name):
@@ -82,25 +182,88 @@ class SWHMirrorForge(SWHConfig):
         }),
         'github': ('dict', {
             'api_token': None,
+            'api_tokens': None,
             'org': 'SoftwareHeritage',
-        })
-
+        }),
+        'concurrency': ('int', MAX_WORKERS),
     }
 
-    def __init__(self):
+    _cached_config = None
+    """Parsed configuration, shared by every instance of the process."""
+
+    _checked = False
+    """Whether the token presence check already ran in this process."""
+
+    def __init__(self, use_cache=True):
+        from .request import make_session
+
         super().__init__()
-        self.config = self.parse_config_file()
+        self.use_cache = use_cache
+        # parse the configuration file once per process, not per
+        # instantiation
+        if SWHMirrorForge._cached_config is None:
+            SWHMirrorForge._cached_config = self.parse_config_file()
+        self.config = SWHMirrorForge._cached_config
         self.forge_token = self.config['forge']['api_token']
         self.forge_url = self.config['forge']['url']
-        self.github_token = self.config['github']['api_token']
-        self.github_org = self.config['github']['org']
+        github_config = self.config['github']
+        # either one 'api_token' or a list under 'api_tokens'; parallel
+        # workers rotate through the pool so the aggregate secondary
+        # rate limit scales with the number of tokens
+        tokens = github_config.get('api_tokens')
+        if not tokens and github_config.get('api_token'):
+            tokens = [github_config['api_token']]
+        self.github_tokens = tokens or []
+        self.github_token = (self.github_tokens[0]
+                             if self.github_tokens else None)
+        self.github_org = github_config['org']
+        self.max_workers = self.config['concurrency']
+        # one pooled session reused by every forge and github call of
+        # this instance, sized so each worker of each token gets its
+        # own connection
+        self.session = make_session(
+            pool_maxsize=self.max_workers * max(1, len(self.github_tokens)))
         self._check()
+        # built once: every github call sends the same headers
+        self._github_headers = {
+            'Authorization': 'token %s' % self.github_token,
+            'Accept': 'application/vnd.github+json',
+        }
+        self._token_cycle = (itertools.cycle(self.github_tokens)
+                             if self.github_tokens else None)
+        self._token_lock = threading.Lock()
+        # memoizes credential_key_id -> phid; the lock also serializes
+        # concurrent workers resolving the same key
+        self._key_phid_cache = {}
+        self._key_phid_lock = threading.Lock()
+        # memoizes repository information per run; the key includes the
+        # identifier's type so 42 and '42' cannot collide
+        self._repo_info_cache = {}
+        self._repo_info_lock = threading.Lock()
+        # maps github repo url -> (etag, body) for conditional gets;
+        # a 304 answer does not count against the api rate limit
+        self._etag_cache = {}
+        self._etag_lock = threading.Lock()
+        # one lock per repository being mirrored, deduplicating
+        # concurrent work on the same repo_id
+        self._inflight = {}
+        self._inflight_guard = threading.Lock()
+        # memoizes materialized repository listings per query name; the
+        # generation counter lets write-invalidation void traversals
+        # that are still streaming
+        self._repo_list_cache = {}
+        self._repo_list_generation = 0
+        self._repo_list_lock = threading.Lock()
 
     def _check(self):
         """Check the needed tokens are set or fail with an explanatory
-           message.
+           message. Only checks once per process since the configuration
+           is cached.
 
         """
+        if SWHMirrorForge._checked:
+            return
+
         if not self.forge_token:
             raise ValueError("""Install the phabricator forge's token in
     $SWH_CONFIG_PATH/mirror-forge/config.yml
@@ -117,6 +280,8 @@ class SWHMirrorForge(SWHConfig):
     Once the installation is done, you can trigger this
     script again.""" % self.github_org)
 
+        SWHMirrorForge._checked = True
+
     def get_repo_info(self, repo_id):
         """Returns bare information on the repository identified by repo_id.
 
@@ -129,21 +294,57 @@ class SWHMirrorForge(SWHConfig):
             information on repository as dict.
 
         """
-        # Retrieve repository information
-        if isinstance(repo_id, int):
-            constraint_key = "ids"
-        elif repo_id.startswith("PHID"):
-            constraint_key = "phids"
-        else:
-            constraint_key = "callsigns"
+        from .request import RepositorySearch
 
-        data = RepositorySearch(self.forge_url, self.forge_token).post({
+        constraint_key, repo_id = classify_repo_id(repo_id)
+        cache_key = (type(repo_id).__name__, repo_id)
+        with self._repo_info_lock:
+            if cache_key in self._repo_info_cache:
+                return self._repo_info_cache[cache_key]
+
+        data = RepositorySearch(self.forge_url, self.forge_token,
+                                use_cache=self.use_cache,
+                                session=self.session).post({
             'constraints[%s][0]' % constraint_key: repo_id,
             'attachments[uris]': True
         })
 
+        with self._repo_info_lock:
+            self._repo_info_cache[cache_key] = data[0]
         return data[0]
 
+    def _resolve_key_phid(self, credential_key_id):
+        """Resolve the phid of the passphrase identified by
+           credential_key_id. Memoized: each key costs at most one
+           query per instance, whichever thread asks first.
+
+        """
+        from .request import PassphraseSearch
+
+        with self._key_phid_lock:
+            if credential_key_id not in self._key_phid_cache:
+                data = PassphraseSearch(self.forge_url, self.forge_token,
+                                        use_cache=self.use_cache,
+                                        session=self.session).post({
+                    'ids[0]': credential_key_id
+                })
+                self._key_phid_cache[credential_key_id] = next(
+                    iter(data.values()))['phid']
+            return self._key_phid_cache[credential_key_id]
+
+    def _next_github_headers(self):
+        """Headers for the next github call, rotating through the
+           configured token pool. With a single token this returns the
+           prebuilt header dict unchanged.
+
+        """
+        if len(self.github_tokens) <= 1:
+            return self._github_headers
+        with self._token_lock:
+            token = next(self._token_cycle)
+        return dict(self._github_headers,
+                    Authorization='token %s' % token)
+
     def create_or_update_repo_on_github(self, repo, update_only=False):
         """Create or update routine on github.
 
@@ -154,38 +355,53 @@ class SWHMirrorForge(SWHConfig):
 
         """
 
+        from .request import TRANSIENT_STATUSES
+
         repo_url = 'https://api.github.com/repos/%s/%s' % (
             self.github_org, repo['name'])
 
-        request_headers = {
-            'Authorization': 'token %s' % self.github_token,
-        }
-
-        expected_project_data = {
-            "name": repo['name'],
-            "description": 'GitHub mirror of ' + repo['description'],
-            "homepage": repo['url'],
-            "private": False,
-            "has_issues": False,
-            "has_wiki": False,
-            "has_downloads": True,
-            "has_projects": False,
-        }
-
-        r = requests.get(repo_url, headers=request_headers)
-        if r.ok:
+        request_headers = self._next_github_headers()
+
+        expected_project_data = dict(
+            GITHUB_REPO_SETTINGS,
+            name=repo['name'],
+            description='GitHub mirror of ' + repo['description'],
+            homepage=repo['url'],
+        )
+
+        with self._etag_lock:
+            cached = self._etag_cache.get(repo_url)
+        get_headers = request_headers
+        if cached is not None:
+            get_headers = dict(request_headers,
+                               **{'If-None-Match': cached[0]})
+
+        r = self.session.get(repo_url, headers=get_headers)
+        if r.status_code == 304:
+            # unchanged since last seen: reuse the cached body, the 304
+            # was free rate-limit-wise
+            project_data = cached[1]
+        elif r.ok:
             project_data = r.json()
+            etag = r.headers.get('ETag')
+            if etag is not None:
+                with self._etag_lock:
+                    self._etag_cache[repo_url] = (etag, project_data)
+        else:
+            project_data = None
+
+        if project_data is not None:
             if any(project_data[key] != value
                    for key, value in expected_project_data.items()):
-                query_fn = requests.patch
+                query_fn = self.session.patch
                 error_msg_action = 'update'
                 api_url = repo_url
             else:
-                print('Repo up to date: %s' % repo['name'])
+                locked_print('Repo up to date: %s' % repo['name'])
                 return
         else:
             if not update_only and r.status_code == 404:
-                query_fn = requests.post
+                query_fn = self.session.post
                 error_msg_action = 'create'
                 api_url = ('https://api.github.com/orgs/%s/repos' %
                            self.github_org)
@@ -204,14 +420,47 @@ class SWHMirrorForge(SWHConfig):
             headers=request_headers,
             json=expected_project_data)
 
+        if r.status_code in (403, 429):
+            # a rate-limit rejection is not a failure: wait for the
+            # limit to regenerate and replay once instead of aborting
+            # the whole batch
+            sleep_for = rate_limit_delay(r)
+            if sleep_for is not None:
+                locked_print(
+                    'Github rate limit reached, sleeping %ss before '
+                    'retrying %s' % (sleep_for, repo['name']))
+                time.sleep(sleep_for)
+                r = query_fn(
+                    url=api_url,
+                    headers=request_headers,
+                    json=expected_project_data)
+
+        if not r.ok and r.status_code in TRANSIENT_STATUSES:
+            # The create/update is not retried at the transport level
+            # (it is not idempotent); check whether it actually went
+            # through before replaying it once.
+            check = self.session.get(repo_url, headers=request_headers)
+            if check.ok and error_msg_action == 'create':
+                return
+            r = query_fn(
+                url=api_url,
+                headers=request_headers,
+                json=expected_project_data)
+
         if not r.ok:
             raise ValueError(
                 "Failure to %s the repository '%s' in github. Status: %s (%s)"
                 % (error_msg_action, repo['name'], r.status_code, r.json())
             )
 
+        # the repository changed on github; the conditional-get entry
+        # is now stale
+        with self._etag_lock:
+            self._etag_cache.pop(repo_url, None)
+
     def mirror_repo_to_github(self, repo_id, credential_key_id,
-                              dry_run=False):
+                              dry_run=False, repository_information=None,
+                              key_phid=None):
         """Instantiate a mirror from a repository forge to github if it does
         not already exist.
 
@@ -229,6 +478,14 @@ class SWHMirrorForge(SWHConfig):
                     check is done to stop if a mirror uri is already
                     referenced in the forge about github.
 
+            repository_information: if provided, information on the
+                    repository already fetched (e.g. by a batched
+                    search), saving the per-repository query.
+
+            key_phid: if provided, the phid of the credential
+                    credential_key_id points to, saving the passphrase
+                    query.
+
         Returns:
             the repository instance whose mirror has been successfully
             mirrored. None if the mirror already exists.
@@ -238,7 +495,41 @@ class SWHMirrorForge(SWHConfig):
             The detail of the error is in the message.
 
         """
-        repository_information = self.get_repo_info(repo_id)
+        # Serialize concurrent calls for the same repository: the
+        # follow-up caller waits on the lock, then re-validates against
+        # refreshed state and exits through the already-mirrored branch
+        # instead of racing a duplicate github creation.
+        with self._inflight_guard:
+            lock = self._inflight.setdefault(repo_id, threading.Lock())
+        contended = not lock.acquire(False)
+        if contended:
+            lock.acquire()
+        try:
+            if contended:
+                # the holder may just have edited this repository's
+                # uris; our caller-supplied snapshot predates that, so
+                # drop it and re-fetch (the edit cleared the repo-info
+                # cache, making the fetch see the new state)
+                repository_information = None
+            return self._mirror_repo_to_github(
+                repo_id, credential_key_id, dry_run,
+                repository_information, key_phid)
+        finally:
+            lock.release()
+            with self._inflight_guard:
+                self._inflight.pop(repo_id, None)
+
+    def _mirror_repo_to_github(self, repo_id, credential_key_id,
+                               dry_run, repository_information, key_phid):
+        """Actual mirroring work; callers go through
+           mirror_repo_to_github, which deduplicates concurrent calls
+           on the same repository.
+
+        """
+        from .request import DiffusionUriEdit, clear_cache
+
+        if repository_information is None:
+            repository_information = self.get_repo_info(repo_id)
         repo = format_repo_information(repository_information, self.forge_url,
                                        self.github_org)
 
@@ -251,39 +542,52 @@ class SWHMirrorForge(SWHConfig):
             raise ValueError("Repository view policy for %s is not public" %
                              repo['name'])
 
-        # Retrieve credential information
-        data = PassphraseSearch(self.forge_url, self.forge_token).post({
-            'ids[0]': credential_key_id
-        })
-
-        # Retrieve the phid for that passphrase
-        key_phid = list(data.values())[0]['phid']
-
         # Check existence of mirror already set
         exists = mirror_exists(repository_information)
 
+        if dry_run:
+            # Describing the plan only needs the search data (served
+            # from cache when possible) plus, when a github uri is
+            # already present, the credential phid - one cacheable,
+            # memoized read - so the printed plan matches what a real
+            # run would decide.
+            if not exists:
+                locked_print("** DRY RUN - would create url %s" %
+                             repo['url_github'])
+                return repo
+            if key_phid is None:
+                key_phid = self._resolve_key_phid(credential_key_id)
+            if (exists['effective'] == repo['url_github']
+                    and exists['credential'] == key_phid):
+                locked_print('Repo %s: URL already exists and matches' %
+                             repo['name'])
+                return None
+            locked_print("** DRY RUN - would change %s (%s) to url %s" % (
+                exists['phid'], exists['effective'], repo['url_github']))
+            return repo
+
+        # Retrieve the phid of the push credential
+        if key_phid is None:
+            key_phid = self._resolve_key_phid(credential_key_id)
+
         if (exists
                 and exists['effective'] == repo['url_github']
                 and exists['credential'] == key_phid):
-            print('Repo %s: URL already exists and matches' % repo['name'])
+            locked_print('Repo %s: URL already exists and matches' %
+                         repo['name'])
             return None
 
         # Create repository in github
-        if not dry_run:
-            self.create_or_update_repo_on_github(repo, update_only=False)
-
-        transaction_data = {
-            'transactions[0][type]': 'credential',
-            'transactions[0][value]': key_phid,
-            'transactions[1][type]': 'uri',
-            'transactions[1][value]': repo['url_github'],
-            'transactions[2][type]': 'io',
-            'transactions[2][value]': 'mirror',
-            'transactions[3][type]': 'display',
-            'transactions[3][value]': 'never',
-            'transactions[4][type]': 'disable',
-            'transactions[4][value]': 'false',
-        }
+        self.create_or_update_repo_on_github(repo, update_only=False)
+
+        transaction_data = dict(
+            MIRROR_TRANSACTION_DATA,
+            **{
+                'transactions[0][type]': 'credential',
+                'transactions[0][value]': key_phid,
+                'transactions[1][type]': 'uri',
+                'transactions[1][value]': repo['url_github'],
+            })
         txn_last_index = 5
 
         # Install the github mirror in the forge
@@ -292,21 +596,66 @@ class SWHMirrorForge(SWHConfig):
                 'transactions[%s][type]' % txn_last_index: 'repository',
                 'transactions[%s][value]' % txn_last_index: repo['phid'],
             })
-            if dry_run:
-                print("** DRY RUN - would create url %s" % repo['url_github'])
         else:
             transaction_data['objectIdentifier'] = exists['phid']
-            if dry_run:
-                print("** DRY RUN - would change %s (%s) to url %s" % (
-                    exists['phid'], exists['effective'], repo['url_github']))
 
-        if not dry_run:
-            DiffusionUriEdit(self.forge_url, self.forge_token).post(
-                transaction_data
-            )
+        DiffusionUriEdit(self.forge_url, self.forge_token,
+                         session=self.session).post(
+            transaction_data
+        )
+        # the forge's uris changed, drop stale cached reads - the
+        # memoized listings too, their entries embed the uri
+        # attachments a later bulk run would trust
+        clear_cache()
+        with self._repo_info_lock:
+            self._repo_info_cache.clear()
+        with self._repo_list_lock:
+            self._repo_list_cache.clear()
+            # void any traversal still streaming so it cannot
+            # re-install its pre-edit entries once it completes
+            self._repo_list_generation += 1
 
         return repo
 
+    def _list_repos(self, query_name, attachments=False):
+        """List the repositories matched by query_name, memoized for
+           REPO_LIST_TTL seconds so back-to-back bulk commands (a
+           mirror pass followed by an update pass, as a cron would run
+           them) traverse conduit's pagination once.
+
+        Yields:
+            repositories as per RepositoriesToMirror; a warm cache is
+            replayed from its materialized tuple with zero network
+            traffic, a cold one streams pages while recording them.
+
+        """
+        from .request import RepositoriesToMirror
+
+        key = (query_name, attachments)
+        with self._repo_list_lock:
+            cached = self._repo_list_cache.get(key)
+            generation = self._repo_list_generation
+        if cached is not None and time.time() - cached[0] < REPO_LIST_TTL:
+            for repo in cached[1]:
+                yield repo
+            return
+
+        body = {'queryKey': query_name}
+        if attachments:
+            body['attachments[uris]'] = True
+        seen = []
+        for repo in RepositoriesToMirror(self.forge_url, self.forge_token,
+                                         use_cache=self.use_cache,
+                                         session=self.session).post(body):
+            seen.append(repo)
+            yield repo
+        with self._repo_list_lock:
+            # workers may have edited uris (and bumped the generation)
+            # while the traversal streamed; storing the listing then
+            # would resurrect its pre-edit attachments
+            if generation == self._repo_list_generation:
+                self._repo_list_cache[key] = (time.time(), tuple(seen))
+
     def mirror_repos_to_github(self, query_name, credential_key_id, dry_run):
         """Mirror repositories to github.
 
@@ -323,42 +672,93 @@ class SWHMirrorForge(SWHConfig):
                     check is done to stop if a mirror uri is already
                     referenced in the forge about github.
 
-        Returns:
-            dict with keys 'mirrored', 'skipped' and 'errors' keys.
+        Yields:
+            message per repository detailing the mirroring status.
 
         """
-        repositories = list(
-            RepositoriesToMirror(self.forge_url, self.forge_token).post({
-                'queryKey': query_name}))
+        repositories = self._list_repos(query_name, attachments=True)
 
-        if not repositories:
-            return None
+        # the credential is loop-invariant: resolved once, lazily so an
+        # empty listing costs no query (dry runs resolve it too, once a
+        # github uri shows up, so the plan checks credentials like a
+        # real run)
+        key_phid = None
 
-        for repo in repositories:
-            repo_id = repo['id']
+        def mirror_one(repo):
+            if dry_run:
+                locked_print("** DRY RUN - name '%s' ; id '%s' **" % (
+                    repo['name'], repo['id']))
+
+            repo_detail = self.mirror_repo_to_github(
+                repo['id'], credential_key_id, dry_run,
+                repository_information=repo.get('information'),
+                key_phid=key_phid)
+
+            if repo_detail:
+                return "Repository %s mirrored at %s." % (
+                    repo_detail['url'], repo_detail['url_github'])
+            return 'Mirror already configured for %s, stopping.' % (
+                repo['name'])
+
+        def result_message(future):
             try:
-                if dry_run:
-                    print("** DRY RUN - name '%s' ; id '%s' **" % (
-                        repo['name'], repo_id))
-
-                repo_detail = self.mirror_repo_to_github(
-                    repo_id, credential_key_id, dry_run)
-
-                if repo_detail:
-                    yield "Repository %s mirrored at %s." % (
-                        repo_detail['url'], repo_detail['url_github'])
-                else:
-                    yield 'Mirror already configured for %s, stopping.' % (
-                        repo['name'])
+                return future.result()
             except Exception as e:
-                yield str(e)
-
-    def update_mirror_info(self, repo_id, dry_run):
+                return str(e)
+
+        # Stream the listing into the pool: workers start on page one
+        # while later conduit pages are still being fetched, and the
+        # bounded pending set pauses the listing when the pool is
+        # saturated.
+        pending = set()
+        bound = self.max_workers * 2
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) \
+                as executor:
+            for repo in repositories:
+                if not dry_run and key_phid is None:
+                    key_phid = self._resolve_key_phid(credential_key_id)
+
+                # Repositories whose mirror uri and credential already
+                # match are reported right away and never reach the
+                # workers.
+                info = repo.get('information')
+                exists = mirror_exists(info) if info is not None else None
+                if exists is not None:
+                    if key_phid is None:  # dry run, first github uri
+                        key_phid = self._resolve_key_phid(
+                            credential_key_id)
+                    detail = format_repo_information(
+                        info, self.forge_url, self.github_org)
+                    if (exists['effective'] == detail['url_github']
+                            and exists['credential'] == key_phid):
+                        yield 'Mirror already configured for %s, stopping.' % (
+                            repo['name'])
+                        continue
+
+                pending.add(executor.submit(mirror_one, repo))
+                while len(pending) >= bound:
+                    done, pending = wait(pending,
+                                         return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield result_message(future)
+
+            for future in as_completed(pending):
+                yield result_message(future)
+
+    def update_mirror_info(self, repo_id, dry_run,
+                           repository_information=None):
         """Given a repository identifier, retrieve information on such
            repository and update github information on that repository.
 
+        Args:
+            repository_information: if provided, information on the
+                    repository already fetched (e.g. by the listing
+                    query), saving the per-repository query.
+
         """
-        repository_information = self.get_repo_info(repo_id)
+        if repository_information is None:
+            repository_information = self.get_repo_info(repo_id)
 
         # Retrieve exhaustive information on repository
         repo = format_repo_information(repository_information, self.forge_url,
@@ -378,28 +778,96 @@ class SWHMirrorForge(SWHConfig):
            repositories.
 
         """
-        repositories = list(
-            RepositoriesToMirror(self.forge_url, self.forge_token).post({
-                'queryKey': query_name}))
+        # asking for attachments keys the memoized listing identically
+        # to the mirror pass, so a mirrors-then-updates sequence
+        # traverses conduit once; it also spares one repository search
+        # per repo below
+        repositories = self._list_repos(query_name, attachments=True)
 
-        if not repositories:
-            return None
+        def update_one(repo):
+            if dry_run:
+                locked_print("** DRY RUN - name '%s' ; id '%s' **" % (
+                    repo['name'], repo['id']))
 
-        for repo in repositories:
-            repo_id = repo['id']
+            repo_detail = self.update_mirror_info(
+                repo['id'], dry_run,
+                repository_information=repo.get('information'))
+
+            if repo_detail:
+                return "Github mirror %s information updated." % (
+                    repo_detail['url_github'])
+
+        def result_message(future):
             try:
-                if dry_run:
-                    print("** DRY RUN - name '%s' ; id '%s' **" % (
-                        repo['name'], repo_id))
+                return future.result()
+            except Exception as e:
+                return str(e)
+
+        # same streaming/back-pressure shape as mirror_repos_to_github
+        pending = set()
+        bound = self.max_workers * 2
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) \
+                as executor:
+            for repo in repositories:
+                pending.add(executor.submit(update_one, repo))
+                while len(pending) >= bound:
+                    done, pending = wait(pending,
+                                         return_when=FIRST_COMPLETED)
+                    for future in done:
+                        msg = result_message(future)
+                        if msg:
+                            yield msg
+
+            for future in as_completed(pending):
+                msg = result_message(future)
+                if msg:
+                    yield msg
+
+
+def mirror_one_repo(mirror_forge, repo_id, credential_key_id, dry_run):
+    """Mirror one repository and report the outcome instead of exiting,
+       so long-lived callers can reuse the same SWHMirrorForge (session,
+       config, caches) across many repositories.
 
-                repo_detail = self.update_mirror_info(repo_id, dry_run)
+    Returns:
+        tuple (ok, message).
 
-                if repo_detail:
-                    yield "Github mirror %s information updated." % (
-                        repo_detail['url_github'])
+    """
+    try:
+        if dry_run:
+            print('** DRY RUN **')
 
-            except Exception as e:
-                yield str(e)
+        repo = mirror_forge.mirror_repo_to_github(
+            repo_id, credential_key_id, dry_run)
+
+        if repo:
+            msg = "Repository %s mirrored at %s." % (
+                repo['url'], repo['url_github'])
+        else:
+            msg = 'Mirror already configured for %s, stopping.' % repo_id
+        return True, msg
+    except Exception as e:
+        return False, str(e)
+
+
+def update_one_mirror(mirror_forge, repo_id, dry_run):
+    """Update one github mirror's information and report the outcome
+       instead of exiting (same rationale as mirror_one_repo).
+
+    Returns:
+        tuple (ok, message).
+
+    """
+    try:
+        if dry_run:
+            print('** DRY RUN **')
+
+        repo = mirror_forge.update_mirror_info(repo_id, dry_run)
+        return True, "Github mirror information %s updated." % (
+            repo['url_github'])
+    except Exception as e:
+        return False, str(e)
 
 
 @click.group()
@@ -407,13 +875,16 @@ def cli(): pass
 
 
 @cli.command()
-@click.option('--repo-id',
+@click.option('--repo-id', required=True,
               help="Repository's identifier (either callsign, id or phid)")
 @click.option('--credential-key-id',
               help="""credential to use for access from phabricator's forge to
                       github""", default=3)
 @click.option('--dry-run/--no-dry-run', default=False)
-def mirror(repo_id, credential_key_id, dry_run):
+@click.option('--cache/--no-cache', default=True,
+              help="""Serve read queries to the forge from a short-lived
+                      on-disk cache.""")
+def mirror(repo_id, credential_key_id, dry_run, cache):
     """Shell interface to instantiate a mirror from a repository forge to
     github. Does nothing if the repository already exists.
 
@@ -432,32 +903,14 @@ def mirror(repo_id, credential_key_id, dry_run):
                 referenced in the forge about github.
 
     """
-    mirror_forge = SWHMirrorForge()
+    mirror_forge = SWHMirrorForge(use_cache=cache)
 
-    try:
-        repo_id = int(repo_id)
-    except Exception:
-        pass
+    repo_id = classify_repo_id(repo_id)[1]
 
-    msg = ''
-    try:
-        if dry_run:
-            print('** DRY RUN **')
-
-        repo = mirror_forge.mirror_repo_to_github(
-            repo_id, credential_key_id, dry_run)
-
-        if repo:
-            msg = "Repository %s mirrored at %s." % (
-                repo['url'], repo['url_github'])
-        else:
-            msg = 'Mirror already configured for %s, stopping.' % repo_id
-    except Exception as e:
-        print(e)
-        sys.exit(1)
-    else:
-        print(msg)
-        sys.exit(0)
+    ok, msg = mirror_one_repo(mirror_forge, repo_id, credential_key_id,
+                              dry_run)
+    print(msg)
+    sys.exit(0 if ok else 1)
 
 
 @cli.command()
@@ -470,7 +923,10 @@ def mirror(repo_id, credential_key_id, dry_run):
 @click.option('--dry-run/--no-dry-run', default=False,
               help="""Do nothing but read and print what would
                       actually happen without the flag.""")
-def mirrors(query_repositories, credential_key_id, dry_run):
+@click.option('--cache/--no-cache', default=True,
+              help="""Serve read queries to the forge from a short-lived
+                      on-disk cache.""")
+def mirrors(query_repositories, credential_key_id, dry_run, cache):
     """Shell interface to instantiate mirrors from a repository forge to
     github. This uses the query_name provided to execute said query.
     The resulting repositories is then mirrored to github if not
@@ -490,7 +946,7 @@ def mirrors(query_repositories, credential_key_id, dry_run):
                 referenced in the forge about github.
 
     """
-    mirror_forge = SWHMirrorForge()
+    mirror_forge = SWHMirrorForge(use_cache=cache)
 
     if dry_run:
         print('** DRY RUN **')
@@ -503,10 +959,13 @@ def mirrors(query_repositories, credential_key_id, dry_run):
 
 
 @cli.command()
-@click.option('--repo-id',
+@click.option('--repo-id', required=True,
               help="Repository's identifier (either callsign, id or phid)")
 @click.option('--dry-run/--no-dry-run', default=False)
-def update_github_mirror(repo_id, dry_run):
+@click.option('--cache/--no-cache', default=True,
+              help="""Serve read queries to the forge from a short-lived
+                      on-disk cache.""")
+def update_github_mirror(repo_id, dry_run, cache):
     """Shell interface to instantiate a mirror from a repository forge to
     github. Does nothing if the repository already exists.
 
@@ -522,26 +981,13 @@ def update_github_mirror(repo_id, dry_run):
                 referenced in the forge about github.
 
     """
-    mirror_forge = SWHMirrorForge()
+    mirror_forge = SWHMirrorForge(use_cache=cache)
 
-    try:
-        repo_id = int(repo_id)
-    except Exception:
-        pass
-
-    msg = ''
-    try:
-        if dry_run:
-            print('** DRY RUN **')
+    repo_id = classify_repo_id(repo_id)[1]
 
-        repo = mirror_forge.update_mirror_info(repo_id, dry_run)
-        msg = "Github mirror information %s updated." % repo['url_github']
-    except Exception as e:
-        print(e)
-        sys.exit(1)
-    else:
-        print(msg)
-        sys.exit(0)
+    ok, msg = update_one_mirror(mirror_forge, repo_id, dry_run)
+    print(msg)
+    sys.exit(0 if ok else 1)
 
 
 @cli.command()
@@ -551,7 +997,10 @@ def update_github_mirror(repo_id, dry_run):
 @click.option('--dry-run/--no-dry-run', default=False,
               help="""Do nothing but read and print what would
                       actually happen without the flag.""")
-def update_github_mirrors(query_repositories, dry_run):
+@click.option('--cache/--no-cache', default=True,
+              help="""Serve read queries to the forge from a short-lived
+                      on-disk cache.""")
+def update_github_mirrors(query_repositories, dry_run, cache):
     """Shell interface to update mirrors information on github. This uses
     the query_name provided to execute said query.  The resulting
     repositories' github information is then updated.
@@ -567,7 +1016,7 @@ def update_github_mirrors(query_repositories, dry_run):
                 referenced in the forge about github.
 
     """
-    mirror_forge = SWHMirrorForge()
+    mirror_forge = SWHMirrorForge(use_cache=cache)
 
     if dry_run:
         print('** DRY RUN **')